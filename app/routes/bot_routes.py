@@ -1,53 +1,103 @@
+import hashlib
+import hmac
 import json
 import os
 import re
+import threading
+import time
+from collections import OrderedDict
 from flask import Blueprint, request, jsonify, Response
 from typing import List, Optional
 from dataclasses import dataclass, field as dc_field
-from app.services.file_store import setups_by_user, save_setups, leads, save_leads, page_to_setup_map, clear_leads
+from app.services.file_store import setups_by_user, save_setups, leads, save_leads, page_to_setup_map, clear_leads, leads_lock, write_json_atomic
 from app.services.context_builder import build_context
-from app.services.ai_client import generate_deepseek_stream, generate_chatgpt_stream
-from app.services.parser import parse_booking_confirmation
+from app.services.ai_client import route_model, routed_stream, get_routing_report, record_routing_outcome, generate_chatgpt_reply, generate_deepseek_reply
+from app.services.parser import parse_booking_confirmation, JSONFilterState, strip_json_blocks
+from app.services.conversation_queue import ConversationQueue, QueueFull
+from app.services.outbound_sender import get_sender
+from app.services.stream_batcher import batcher_from_args, wants_gzip, gzip_stream
+from app.services.search_index import index_message, index_lead, clear_messages_index, clear_leads_index, search
+from app.services.chat_logger import get_logger, log_token, conversation_context, record_turn, recent_turns
 
 bot_bp = Blueprint("bot", __name__)
 conversations = {}
 blocked_users = {}
 CONVERSATIONS_FILE = "conversations.json"
 CHAT_STATUS_FILE = "chat_status.json"
+WEBHOOK_VERIFY_TOKEN = os.getenv("WEBHOOK_VERIFY_TOKEN")
+FB_APP_SECRET = os.getenv("FB_APP_SECRET")
+# Local development only: accept webhook POSTs without a signature
+WEBHOOK_ALLOW_UNSIGNED = os.getenv("WEBHOOK_ALLOW_UNSIGNED", "").lower() in ("1", "true", "yes")
+WEBHOOK_PROVIDER = os.getenv("WEBHOOK_MODEL", "chatgpt").lower()
+SEEN_MESSAGE_IDS_LIMIT = 10000
+log = get_logger("bot_routes")
+conversations_lock = threading.RLock()
+chat_status_lock = threading.RLock()
 
 def clear_conversations_file():
     global conversations
-    conversations = {}
-    if os.path.exists(CONVERSATIONS_FILE):
-        with open(CONVERSATIONS_FILE, "w", encoding="utf-8") as f:
-            f.write("{}")
-    print("[INFO] conversations.json cleared on server start")
+    with conversations_lock:
+        conversations = {}
+        if os.path.exists(CONVERSATIONS_FILE):
+            write_json_atomic(CONVERSATIONS_FILE, {})
+    clear_messages_index()
+    log.info("conversations.json cleared on server start")
 
 def save_conversations_to_file():
-    with open(CONVERSATIONS_FILE, "w", encoding="utf-8") as f:
-        json.dump(conversations, f, indent=2, ensure_ascii=False)
+    with conversations_lock:
+        write_json_atomic(CONVERSATIONS_FILE, conversations, indent=2, ensure_ascii=False)
+
+def append_message(conv_key, role, content):
+    """Append a message to a conversation and persist it"""
+    with conversations_lock:
+        conversations[conv_key].append({"role": role, "content": content})
+        save_conversations_to_file()
+    record_turn(conv_key, role, content)
+    index_message(conv_key, role, content)
+
+def find_lead(user_id, page_id):
+    return next((l for l in leads if l["user_id"] == user_id and l["page_id"] == page_id), None)
+
+def update_lead(user_id, page_id, full_response):
+    """Merge any JSON fields from an assistant reply into the user's lead"""
+    confirmed = parse_booking_confirmation(full_response)
+    if not confirmed:
+        return
+    confirmed["user_id"] = user_id
+    confirmed["page_id"] = page_id
+    with leads_lock:
+        existing_lead = find_lead(user_id, page_id)
+        if existing_lead:
+            existing_lead.update(confirmed)
+        else:
+            existing_lead = confirmed
+            leads.append(confirmed)
+        save_leads()
+        index_lead(existing_lead)
 
 def load_chat_status():
     """Load chat status from file"""
-    if os.path.exists(CHAT_STATUS_FILE):
-        with open(CHAT_STATUS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    with chat_status_lock:
+        if os.path.exists(CHAT_STATUS_FILE):
+            with open(CHAT_STATUS_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
 
 def save_chat_status(chat_status):
     """Save chat status to file"""
-    with open(CHAT_STATUS_FILE, "w", encoding="utf-8") as f:
-        json.dump(chat_status, f, indent=2, ensure_ascii=False)
+    with chat_status_lock:
+        write_json_atomic(CHAT_STATUS_FILE, chat_status, indent=2, ensure_ascii=False)
 
 def set_chat_closed(user_id, page_id, closed=True):
     """Set chat closed status for a user"""
-    chat_status = load_chat_status()
-    conv_key = f"{page_id}_{user_id}"
-    if closed:
-        chat_status[conv_key] = {"closed": True, "closed_at": str(os.path.getmtime(CONVERSATIONS_FILE))}
-    else:
-        chat_status.pop(conv_key, None)
-    save_chat_status(chat_status)
+    with chat_status_lock:
+        chat_status = load_chat_status()
+        conv_key = f"{page_id}_{user_id}"
+        if closed:
+            chat_status[conv_key] = {"closed": True, "closed_at": str(os.path.getmtime(CONVERSATIONS_FILE))}
+        else:
+            chat_status.pop(conv_key, None)
+        save_chat_status(chat_status)
 
 def is_chat_closed(user_id, page_id):
     """Check if chat is closed for a user"""
@@ -62,33 +112,68 @@ if os.path.exists(CONVERSATIONS_FILE):
 
 def clear_chat_status_file():
     """Clear the chat status file"""
-    if os.path.exists(CHAT_STATUS_FILE):
-        with open(CHAT_STATUS_FILE, "w", encoding="utf-8") as f:
-            f.write("{}")
-    print("[INFO] chat_status.json cleared")
+    with chat_status_lock:
+        if os.path.exists(CHAT_STATUS_FILE):
+            write_json_atomic(CHAT_STATUS_FILE, {})
+    log.info("chat_status.json cleared")
 
 
 @bot_bp.route("/clear-conversations", methods=["POST"])
 def clear_conversations():
     global conversations
-    conversations = {}
-    save_conversations_to_file()
+    with conversations_lock:
+        conversations = {}
+        save_conversations_to_file()
     save_chat_status({})
+    clear_messages_index()
     
     return jsonify({"status": "ok", "message": "All conversations cleared"})
 
 @bot_bp.route("/leads", methods=["GET"])
 def get_all_leads():
-    return jsonify(leads)
+    with leads_lock:
+        return jsonify([dict(lead) for lead in leads])
 
 @bot_bp.route("/clear-leads", methods=["POST"])
 def clear_leads_endpoint():
     try:
         clear_leads()
+        clear_leads_index()
         return jsonify({"status": "ok", "message": "All leads cleared"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@bot_bp.route("/search", methods=["GET"])
+def search_endpoint():
+    page_id = request.args.get("page_id")
+    query = request.args.get("q", "").strip()
+    kind = request.args.get("type", "messages").lower()
+    limit = request.args.get("limit", 20, type=int)
+    offset = request.args.get("offset", 0, type=int)
+
+    if not all([page_id, query]):
+        return jsonify({"error": "Missing page_id or q"}), 400
+    if kind not in ("messages", "leads"):
+        return jsonify({"error": "type must be 'messages' or 'leads'"}), 400
+
+    try:
+        return jsonify(search(page_id, query, kind=kind, limit=limit, offset=offset))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@bot_bp.route("/routing-stats", methods=["GET"])
+def get_routing_stats():
+    return jsonify(get_routing_report())
+
+@bot_bp.route("/recent-turns", methods=["GET"])
+def get_recent_turns():
+    user_id = request.args.get("user_id")
+    page_id = request.args.get("page_id")
+    limit = request.args.get("limit", type=int)
+
+    conv_key = f"{page_id}_{user_id}" if user_id and page_id else None
+    return jsonify(recent_turns(conv_key, limit))
+
 @bot_bp.route("/conversation-history", methods=["GET"])
 def get_conversation_history():
     user_id = request.args.get("user_id")
@@ -146,6 +231,7 @@ def chat_stream():
     message = request.args.get("message", "").strip()
     page_id = request.args.get("page_id")
     model = request.args.get("model", "chatgpt").lower()
+    latency_budget_ms = request.args.get("latency_budget_ms", type=int)
 
     if not all([user_id, page_id]):
         return jsonify({"error": "Missing required parameters"}), 400
@@ -159,83 +245,46 @@ def chat_stream():
         return jsonify({"error": "Setup not found"}), 404
 
     conv_key = f"{page_id}_{user_id}"
+    batcher = batcher_from_args(request.args)
+    use_gzip = wants_gzip(request.args, request.headers)
     
-    if conv_key not in conversations:
-        system_prompt = build_context(setup)
-        conversations[conv_key] = [{"role": "system", "content": system_prompt}]
-        save_conversations_to_file()
+    with conversations_lock:
+        if conv_key not in conversations:
+            system_prompt = build_context(setup)
+            conversations[conv_key] = [{"role": "system", "content": system_prompt}]
+            save_conversations_to_file()
 
     def generate_stream():
+        with conversation_context(conv_key):
+            yield from stream_turn()
+
+    def stream_turn():
         try:
             if message:
-                conversations[conv_key].append({"role": "user", "content": message})
-                save_conversations_to_file()
-
-            if model == "deepseek":
-                stream_generator = generate_deepseek_stream(conversations[conv_key])
-            else:
-                stream_generator = generate_chatgpt_stream(conversations[conv_key])
+                append_message(conv_key, "user", message)
+
+            provider = "deepseek" if model == "deepseek" else "chatgpt"
+            current_lead = find_lead(user_id, page_id)
+            decision = route_model(
+                conversations[conv_key],
+                provider=provider,
+                fields=setup.get("field", []),
+                lead=current_lead,
+                latency_budget_ms=latency_budget_ms,
+            )
+            stream_generator = routed_stream(conversations[conv_key], decision)
 
             full_response = ""
             visible_response = ""
             close_chat_triggered = False
 
-            class JSONFilterState:
-                def __init__(self):
-                    self.buffer = ""
-                    self.in_json = False
-                    self.json_start_marker = "<<JSON>>"
-                    self.json_end_marker = "<<ENDJSON>>"
-                    self.start_marker_len = len(self.json_start_marker)
-                    self.end_marker_len = len(self.json_end_marker)
-
-                def process_chunk(self, chunk):
-                    self.buffer += chunk
-                    visible_parts = []
-
-                    while self.buffer:
-                        if not self.in_json:
-                            start_pos = self.buffer.find(self.json_start_marker)
-                            if start_pos != -1:
-                                if start_pos > 0:
-                                    visible_parts.append(self.buffer[:start_pos])
-                                self.buffer = self.buffer[start_pos + self.start_marker_len:]
-                                self.in_json = True
-                            else:
-                                if len(self.buffer) >= self.start_marker_len:
-                                    visible_parts.append(self.buffer)
-                                    self.buffer = ""
-                                else:
-                                    if self.json_start_marker.startswith(self.buffer):
-                                        break
-                                    else:
-                                        visible_parts.append(self.buffer)
-                                        self.buffer = ""
-                                break
-                        else:
-                            end_pos = self.buffer.find(self.json_end_marker)
-                            if end_pos != -1:
-                                self.buffer = self.buffer[end_pos + self.end_marker_len:]
-                                self.in_json = False
-                            else:
-                                if len(self.buffer) >= self.end_marker_len:
-                                    self.buffer = ""
-                                else:
-                                    break
-                    return visible_parts
-
-                def get_remaining_visible(self):
-                    if self.buffer and not self.in_json:
-                        return self.buffer
-                    return ""
-
             json_filter = JSONFilterState()
 
             for chunk in stream_generator:
 
                 chunk_str = str(chunk)
                 full_response += chunk_str
-                print(chunk_str, end="", flush=True)
+                log_token(log, chunk_str, model=model)
                 if "'close_chat': True" in chunk_str or '"close_chat": true' in chunk_str:
                     try:
                         import ast
@@ -244,14 +293,14 @@ def chat_stream():
                         if isinstance(chunk_dict, dict) and chunk_dict.get("close_chat"):
                             message_content = chunk_dict.get('message', '')
                             
-                            conversations[conv_key].append({
-                                "role": "assistant", 
-                                "content": message_content
-                            })
-                            save_conversations_to_file()
+                            append_message(conv_key, "assistant", message_content)
                             
                             set_chat_closed(user_id, page_id, True)
 
+                            pending = batcher.flush()
+                            if pending:
+                                yield pending
+
                             close_data = {
                                 'content': message_content,
                                 'close_chat': True,
@@ -267,7 +316,19 @@ def chat_stream():
                 for part in visible_parts:
                     if part.strip():
                         visible_response += part
-                        yield f"data: {json.dumps({'content': part})}\n\n"
+                        frame = batcher.add(part)
+                        if frame:
+                            yield frame
+
+                # Check the window on every upstream chunk, and don't hold the
+                # visible tail back while the model writes a JSON block
+                pending = batcher.flush() if json_filter.in_json else batcher.poll()
+                if pending:
+                    yield pending
+
+            pending = batcher.flush()
+            if pending:
+                yield pending
 
             if not close_chat_triggered:
                 if "'close_chat': True" in full_response or '"close_chat": true' in full_response:
@@ -277,8 +338,7 @@ def chat_stream():
                         if message_match:
                             message_content = message_match.group(1)
 
-                            conversations[conv_key].append({"role": "assistant", "content": message_content})
-                            save_conversations_to_file()
+                            append_message(conv_key, "assistant", message_content)
                             
                             set_chat_closed(user_id, page_id, True)
 
@@ -289,37 +349,173 @@ def chat_stream():
                             }
                             yield f"data: {json.dumps(close_data)}\n\n"
                         else:
-                            conversations[conv_key].append({"role": "assistant", "content": full_response})
-                            save_conversations_to_file()
+                            append_message(conv_key, "assistant", full_response)
                     except Exception as e:
-                        conversations[conv_key].append({"role": "assistant", "content": full_response})
-                        save_conversations_to_file()
+                        append_message(conv_key, "assistant", full_response)
                 else:
                     # Normal response handling
                     remaining_visible = json_filter.get_remaining_visible()
                     if remaining_visible:
                         visible_response += remaining_visible
-                        yield f"data: {json.dumps({'content': remaining_visible})}\n\n"
+                        pending = batcher.add(remaining_visible) or batcher.flush()
+                        if pending:
+                            yield pending
 
-                    conversations[conv_key].append({"role": "assistant", "content": full_response})
-                    save_conversations_to_file()
+                    append_message(conv_key, "assistant", full_response)
 
                     # Extract leads from full response (JSON)
-                    confirmed = parse_booking_confirmation(full_response)
-                    if confirmed:
-                        confirmed["user_id"] = user_id
-                        confirmed["page_id"] = page_id
-                        existing_lead = next((l for l in leads if l["user_id"] == user_id and l["page_id"] == page_id), None)
-                        if existing_lead:
-                            existing_lead.update(confirmed)
-                        else:
-                            leads.append(confirmed)
-                        save_leads()
+                    update_lead(user_id, page_id, full_response)
 
             yield "data: [DONE]\n\n"
 
         except Exception as e:
+            log.exception("Stream failed")
+            pending = batcher.flush()
+            if pending:
+                yield pending
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
             yield "data: [DONE]\n\n"
 
-    return Response(generate_stream(), mimetype="text/event-stream")
\ No newline at end of file
+    if use_gzip:
+        response = Response(gzip_stream(generate_stream()), mimetype="text/event-stream")
+        response.headers["Content-Encoding"] = "gzip"
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    return Response(generate_stream(), mimetype="text/event-stream")
+
+
+# -------------------
+# Messenger Webhook
+# -------------------
+def process_webhook_message(conv_key, item):
+    """Answer one inbound message through the non-streaming reply path"""
+    page_id, user_id, text = item["page_id"], item["user_id"], item["text"]
+
+    if is_chat_closed(user_id, page_id):
+        log.info("Ignoring message for closed chat")
+        return
+
+    setup = page_to_setup_map.get(page_id)
+    if not setup:
+        log.warning("No setup for page", extra={"fields": {"page_id": page_id}})
+        return
+
+    with conversations_lock:
+        if conv_key not in conversations:
+            conversations[conv_key] = [{"role": "system", "content": build_context(setup)}]
+    append_message(conv_key, "user", text)
+
+    decision = route_model(
+        conversations[conv_key],
+        provider=WEBHOOK_PROVIDER,
+        fields=setup.get("field", []),
+        lead=find_lead(user_id, page_id),
+        path="reply",
+    )
+    started = time.perf_counter()
+    if decision["provider"] == "deepseek":
+        reply = generate_deepseek_reply(conversations[conv_key])
+    else:
+        reply = generate_chatgpt_reply(conversations[conv_key], model=decision["model"])
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    failed = isinstance(reply, str) and reply.startswith("⚠️")
+    # Whole-reply latency, not time to first token; keep it out of the TTFT estimate
+    record_routing_outcome(decision, None, elapsed_ms, failed)
+
+    if failed:
+        log.warning("Reply failed", extra={"fields": {"error": reply}})
+        return
+
+    if isinstance(reply, dict) and reply.get("close_chat"):
+        append_message(conv_key, "assistant", reply["message"])
+        set_chat_closed(user_id, page_id, True)
+        outbound_sender.send(page_id, user_id, reply["message"])
+        return
+
+    append_message(conv_key, "assistant", reply)
+    update_lead(user_id, page_id, reply)
+
+    visible = strip_json_blocks(reply)
+    if visible:
+        outbound_sender.send(page_id, user_id, visible)
+
+
+outbound_sender = get_sender()
+webhook_queue = ConversationQueue(process_webhook_message)
+seen_message_ids = OrderedDict()
+seen_message_ids_lock = threading.Lock()
+
+
+def is_duplicate_message(mid):
+    """Messenger retries deliveries; drop message IDs already queued"""
+    if not mid:
+        return False
+    with seen_message_ids_lock:
+        if mid in seen_message_ids:
+            return True
+        seen_message_ids[mid] = True
+        if len(seen_message_ids) > SEEN_MESSAGE_IDS_LIMIT:
+            seen_message_ids.popitem(last=False)
+    return False
+
+
+def forget_message(mid):
+    with seen_message_ids_lock:
+        seen_message_ids.pop(mid, None)
+
+
+def has_valid_signature(payload, signature):
+    if not FB_APP_SECRET:
+        return WEBHOOK_ALLOW_UNSIGNED
+    expected = "sha256=" + hmac.new(FB_APP_SECRET.encode(), payload, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or "")
+
+
+@bot_bp.route("/webhook", methods=["GET"])
+def verify_webhook():
+    mode = request.args.get("hub.mode")
+    token = request.args.get("hub.verify_token")
+    challenge = request.args.get("hub.challenge", "")
+
+    if mode == "subscribe" and WEBHOOK_VERIFY_TOKEN and token == WEBHOOK_VERIFY_TOKEN:
+        return challenge, 200
+    return jsonify({"error": "Verification failed"}), 403
+
+
+@bot_bp.route("/webhook", methods=["POST"])
+def receive_webhook():
+    if not has_valid_signature(request.get_data(), request.headers.get("X-Hub-Signature-256")):
+        return jsonify({"error": "Invalid signature"}), 403
+
+    data = request.get_json(silent=True) or {}
+    if data.get("object") != "page":
+        return jsonify({"error": "Unsupported object"}), 404
+
+    for entry in data.get("entry", []):
+        for event in entry.get("messaging", []):
+            message = event.get("message") or {}
+            text = (message.get("text") or "").strip()
+            if not text or message.get("is_echo"):
+                continue
+
+            page_id = str(event.get("recipient", {}).get("id") or entry.get("id"))
+            user_id = str(event.get("sender", {}).get("id"))
+            mid = message.get("mid")
+            if is_duplicate_message(mid):
+                continue
+
+            try:
+                webhook_queue.submit(f"{page_id}_{user_id}", {"page_id": page_id, "user_id": user_id, "text": text})
+            except QueueFull:
+                # Let Messenger redeliver this one later
+                forget_message(mid)
+                log.warning("Webhook queue full")
+                return jsonify({"error": "Busy, retry later"}), 503
+
+    return "EVENT_RECEIVED", 200
+
+
+@bot_bp.route("/webhook-stats", methods=["GET"])
+def get_webhook_stats():
+    return jsonify(webhook_queue.stats())
@@ -4,7 +4,11 @@ import json
 from dotenv import load_dotenv
 from openai import OpenAI
 import re
+import time
+from app.services.chat_logger import get_logger
+from app.services.model_router import route_model, record_routing_outcome, get_routing_report
 
+log = get_logger("ai_client")
 
 # Load .env file
 load_dotenv()
@@ -43,7 +47,7 @@ functions = [
 ]
 
 def handle_close_chat(reason: str) -> dict:
-    print(f"❌ Chat closed: {reason}")
+    log.info("Chat closed", extra={"fields": {"reason": reason}})
     
     # Remove JSON parts from the message content
     def remove_json_from_content(text):
@@ -149,10 +153,10 @@ def generate_deepseek_stream(messages: list):
 # -------------------
 # OpenAI Functions with Function Calling
 # -------------------
-def generate_chatgpt_reply(messages: list) -> str:
+def generate_chatgpt_reply(messages: list, model: str = "gpt-4.1") -> str:
     try:
         response = client.chat.completions.create(
-            model="gpt-4.1",
+            model=model,
             messages=messages,
             functions=functions,
             function_call="auto"
@@ -176,10 +180,10 @@ def generate_chatgpt_reply(messages: list) -> str:
     except Exception as e:
         return f"⚠️ ChatGPT API error: {str(e)}"
 
-def generate_chatgpt_stream(messages: list):
+def generate_chatgpt_stream(messages: list, model: str = "gpt-5"):
     try:
         stream = client.chat.completions.create(
-            model="gpt-5",
+            model=model,
             messages=messages,
             stream=True,
        
@@ -197,7 +201,6 @@ def generate_chatgpt_stream(messages: list):
 
             # Normal text
             if delta.content:
-                print(delta.content, end="", flush=True)
                 yield delta.content
 
             # Function call streaming
@@ -214,3 +217,27 @@ def generate_chatgpt_stream(messages: list):
 
     except Exception as e:
         yield f"⚠️ ChatGPT streaming error: {str(e)}"
+
+# -------------------
+# Per-turn Model Routing
+# -------------------
+def routed_stream(messages: list, decision: dict):
+    """Stream from the routed model, timing first token and completion"""
+    if decision["provider"] == "deepseek":
+        stream = generate_deepseek_stream(messages)
+    else:
+        stream = generate_chatgpt_stream(messages, model=decision["model"])
+
+    started = time.perf_counter()
+    ttft_ms = None
+    error = False
+    try:
+        for chunk in stream:
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+            if isinstance(chunk, str) and chunk.startswith("⚠️"):
+                error = True
+            yield chunk
+    finally:
+        error = error or ttft_ms is None
+        record_routing_outcome(decision, ttft_ms, (time.perf_counter() - started) * 1000, error)
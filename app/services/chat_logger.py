@@ -0,0 +1,148 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# --- Settings ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+TOKEN_LOG_SAMPLE_RATE = float(os.getenv("TOKEN_LOG_SAMPLE_RATE", "0.01"))
+RECENT_TURNS_LIMIT = int(os.getenv("RECENT_TURNS_LIMIT", "200"))
+
+_correlation_id = ContextVar("correlation_id", default="-")
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamp each record with the conversation it belongs to"""
+
+    def filter(self, record):
+        if not hasattr(record, "correlation_id"):
+            record.correlation_id = _correlation_id.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "correlation_id": getattr(record, "correlation_id", "-"),
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never block the caller: drop records when the queue is full"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        """
+        Make the record safe to hand to another thread without folding the
+        traceback into msg, so the listener can still emit it as "exc".
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+# --- Logger Setup ---
+_log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_stream_handler = logging.StreamHandler(sys.stdout)
+_stream_handler.setFormatter(JSONFormatter())
+_listener = logging.handlers.QueueListener(_log_queue, _stream_handler, respect_handler_level=False)
+
+_queue_handler = DroppingQueueHandler(_log_queue)
+_queue_handler.addFilter(CorrelationFilter())
+
+logger = logging.getLogger("careerbot")
+logger.setLevel(LOG_LEVEL)
+logger.addHandler(_queue_handler)
+logger.propagate = False
+
+_listener.start()
+atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logger.getChild(name)
+
+
+@contextmanager
+def conversation_context(conv_key: str):
+    """Bind a conversation key as the correlation ID for the enclosed block"""
+    token = _correlation_id.set(conv_key)
+    try:
+        yield
+    finally:
+        try:
+            _correlation_id.reset(token)
+        except ValueError:
+            # Generator resumed in a different context; nothing to restore
+            pass
+
+
+def log_token(log: logging.Logger, text: str, **fields):
+    """Sampled debug output for individual streamed tokens"""
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    if random.random() >= TOKEN_LOG_SAMPLE_RATE:
+        return
+    log.debug(text, extra={"fields": {"sampled": TOKEN_LOG_SAMPLE_RATE, **fields}})
+
+
+# --- Recent Turns Ring Buffer ---
+_recent_turns = deque(maxlen=RECENT_TURNS_LIMIT)
+_recent_lock = threading.Lock()
+
+
+def record_turn(conv_key: str, role: str, content: str):
+    """Keep a bounded in-memory history of recent turns for debugging"""
+    with _recent_lock:
+        _recent_turns.append({
+            "ts": time.time(),
+            "conv_key": conv_key,
+            "role": role,
+            "content": content,
+        })
+
+
+def recent_turns(conv_key: str = None, limit: int = None) -> list:
+    with _recent_lock:
+        turns = list(_recent_turns)
+    if conv_key:
+        turns = [t for t in turns if t["conv_key"] == conv_key]
+    if limit:
+        turns = turns[-limit:]
+    return turns
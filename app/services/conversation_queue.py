@@ -0,0 +1,65 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.chat_logger import get_logger, conversation_context
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", "1000"))
+
+log = get_logger("conversation_queue")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ConversationQueue:
+    """
+    Run queued work on a bounded thread pool, one conversation at a time.
+    Messages for the same conversation are handled strictly in arrival order;
+    different conversations proceed in parallel up to max_workers.
+    """
+
+    def __init__(self, handler, max_workers=WEBHOOK_WORKERS, max_pending=WEBHOOK_MAX_PENDING):
+        self.handler = handler
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="webhook")
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.pending_count = 0
+
+    def submit(self, conv_key: str, item):
+        """Queue an item; raises QueueFull when the backlog limit is reached"""
+        with self.lock:
+            if self.pending_count >= self.max_pending:
+                raise QueueFull(f"{self.pending_count} messages already pending")
+            self.pending_count += 1
+            items = self.pending.get(conv_key)
+            if items is not None:
+                # A worker is already draining this conversation
+                items.append(item)
+                return
+            self.pending[conv_key] = deque([item])
+        self.executor.submit(self._drain, conv_key)
+
+    def _drain(self, conv_key: str):
+        while True:
+            with self.lock:
+                items = self.pending[conv_key]
+                if not items:
+                    del self.pending[conv_key]
+                    return
+                item = items.popleft()
+                self.pending_count -= 1
+
+            with conversation_context(conv_key):
+                try:
+                    self.handler(conv_key, item)
+                except Exception:
+                    log.exception("Webhook message failed")
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"pending": self.pending_count, "conversations": len(self.pending)}
@@ -1,5 +1,6 @@
 from pathlib import Path
 import json
+import threading
 
 import os
 
@@ -13,14 +14,23 @@ def load_json(path, default=None):
             return default
     return default
 
-def save_json(path, data):
+def write_json_atomic(path, data, **dump_kwargs):
+    """Write through a temp file and os.replace so readers never see a partial file"""
+    path = Path(path)
     path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, **dump_kwargs)
+    os.replace(tmp_path, path)
+
+def save_json(path, data):
+    write_json_atomic(path, data, indent=4)
 
 # --- Data Loading ---
 setups_by_user = load_json(Path("data/setups.json"), default={})
 leads = load_json(Path("data/leads.json"), default=[])
+# Guards the shared lead dicts and leads.json across request and webhook threads
+leads_lock = threading.RLock()
 
 page_to_setup_map = {}
 
@@ -43,14 +53,16 @@ def save_setups():
     build_page_map()  # Keep map in sync
 
 def save_leads():
-    save_json(Path("data/leads.json"), leads)
+    with leads_lock:
+        save_json(Path("data/leads.json"), leads)
 # --- Clear Leads Helper ---
 
 
 def clear_leads():
-    global leads
-    leads = []
+    # Clear in place: other modules hold a reference to this list
+    with leads_lock:
+        leads.clear()
 
-    leads_file = Path("data/leads.json")
-    if leads_file.exists():
-        os.remove(leads_file)  # delete the file
\ No newline at end of file
+        leads_file = Path("data/leads.json")
+        if leads_file.exists():
+            os.remove(leads_file)  # delete the file
\ No newline at end of file
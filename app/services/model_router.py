@@ -0,0 +1,183 @@
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+
+from app.services.chat_logger import get_logger
+
+log = get_logger("model_router")
+
+DEEPSEEK_TIERS = {
+    "fast": "deepseek-chat",
+    "standard": "deepseek-chat",
+    "strong": "deepseek-chat",
+}
+# Tiers per reply path, overridable as OPENAI_<PATH>_<TIER>_MODEL, e.g.
+# OPENAI_STREAM_STANDARD_MODEL. The standard tiers keep the models each path
+# used before routing: gpt-5 for /careerbot-stream, gpt-4.1 for replies.
+MODEL_TIERS = {
+    "stream": {
+        "chatgpt": {
+            "fast": os.getenv("OPENAI_STREAM_FAST_MODEL", "gpt-4.1-mini"),
+            "standard": os.getenv("OPENAI_STREAM_STANDARD_MODEL", "gpt-5"),
+            "strong": os.getenv("OPENAI_STREAM_STRONG_MODEL", "gpt-5"),
+        },
+        "deepseek": DEEPSEEK_TIERS,
+    },
+    "reply": {
+        "chatgpt": {
+            "fast": os.getenv("OPENAI_REPLY_FAST_MODEL", "gpt-4.1-mini"),
+            "standard": os.getenv("OPENAI_REPLY_STANDARD_MODEL", "gpt-4.1"),
+            "strong": os.getenv("OPENAI_REPLY_STRONG_MODEL", "gpt-5"),
+        },
+        "deepseek": DEEPSEEK_TIERS,
+    },
+}
+TIER_ORDER = ["fast", "standard", "strong"]
+
+# Replies made only of these phrases are acknowledgements ("ok", "yes, go on")
+ACK_PHRASES = {
+    "ok", "okay", "k", "yes", "yeah", "yep", "yup", "sure", "no", "nope", "nah",
+    "thanks", "thank you", "thx", "got it", "cool", "great", "nice", "perfect",
+    "right", "correct", "exactly", "agreed", "i agree", "true", "that's right",
+    "that is right", "sounds good", "sounds right", "makes sense", "go on",
+    "go ahead", "continue", "please continue", "let's continue", "next", "skip",
+    "pass", "not sure", "i don't know", "idk",
+}
+# Longer messages are never treated as acknowledgements
+ACK_MAX_CHARS = int(os.getenv("ROUTING_ACK_MAX_CHARS", "40"))
+# With this many setup fields (or fewer) still open, the bot is synthesizing strengths
+SYNTHESIS_REMAINING_FIELDS = int(os.getenv("ROUTING_SYNTHESIS_REMAINING_FIELDS", "2"))
+# Observed samples needed before a model's latency is trusted against a budget
+MIN_LATENCY_SAMPLES = 5
+# Weight of the newest sample in the time-to-first-token moving average
+LATENCY_EWMA_ALPHA = float(os.getenv("ROUTING_LATENCY_EWMA_ALPHA", "0.2"))
+# Share of over-budget turns still sent to the slower tier to refresh its estimate
+PROBE_RATE = float(os.getenv("ROUTING_PROBE_RATE", "0.05"))
+
+_routing_lock = threading.Lock()
+routing_decisions = deque(maxlen=500)
+routing_stats = {}
+
+
+def remaining_fields(fields: list, lead: dict) -> list:
+    """Setup fields the lead has not answered yet"""
+    lead = lead or {}
+    return [f for f in fields if str(lead.get(f, "")).strip() in ("", "...")]
+
+
+def is_acknowledgement(text: str) -> bool:
+    """True when a message carries no new content, e.g. "Yes, go on!" """
+    text = (text or "").strip().lower().replace("’", "'")
+    if not text or len(text) > ACK_MAX_CHARS:
+        return False
+    segments = [s.strip() for s in re.split(r"[,.!?;:\-]+|\s+and\s+", text)]
+    segments = [re.sub(r"[^\w' ]", "", s).strip() for s in segments]
+    segments = [s for s in segments if s]
+    return bool(segments) and all(s in ACK_PHRASES for s in segments)
+
+
+def _observed_ttft_ms(model: str):
+    with _routing_lock:
+        stats = routing_stats.get(model)
+        if not stats or stats["ttft_samples"] < MIN_LATENCY_SAMPLES:
+            return None
+        return stats["ttft_ms_ewma"]
+
+
+def route_model(messages: list, provider: str = "chatgpt", fields: list = None, lead: dict = None,
+                latency_budget_ms: int = None, path: str = "stream") -> dict:
+    """
+    Pick a model for this turn from the conversation stage, the setup fields
+    still open and an optional time-to-first-token budget. `path` is "stream"
+    or "reply" and selects that path's model tiers.
+    """
+    path_tiers = MODEL_TIERS[path]
+    tiers = path_tiers.get(provider, path_tiers["chatgpt"])
+    fields = fields or []
+    remaining = remaining_fields(fields, lead)
+    has_assistant_turn = any(m.get("role") == "assistant" for m in messages)
+    last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+
+    if fields and len(remaining) <= SYNTHESIS_REMAINING_FIELDS:
+        stage, tier = "synthesis", "strong"
+    elif not has_assistant_turn:
+        stage, tier = "opening", "standard"
+    elif is_acknowledgement(last_user):
+        stage, tier = "acknowledgement", "fast"
+    else:
+        stage, tier = "interview", "standard"
+
+    # Step down while the chosen model is estimated to miss the budget.
+    # Synthesis never drops below the standard tier. A small share of turns
+    # keeps the slower model so its estimate can recover after a slow spell.
+    floor = TIER_ORDER.index("standard") if stage == "synthesis" else 0
+    index = TIER_ORDER.index(tier)
+    budget_downgraded = False
+    probe = False
+    if latency_budget_ms:
+        while index > floor:
+            observed = _observed_ttft_ms(tiers[TIER_ORDER[index]])
+            if observed is None or observed <= latency_budget_ms:
+                break
+            if random.random() < PROBE_RATE:
+                probe = True
+                break
+            index -= 1
+            budget_downgraded = True
+
+    return {
+        "provider": provider,
+        "path": path,
+        "model": tiers[TIER_ORDER[index]],
+        "tier": TIER_ORDER[index],
+        "stage": stage,
+        "remaining_fields": len(remaining),
+        "latency_budget_ms": latency_budget_ms,
+        "budget_downgraded": budget_downgraded,
+        "probe": probe,
+    }
+
+
+def record_routing_outcome(decision: dict, ttft_ms, total_ms: float, error: bool = False):
+    """
+    Store a routing decision with its measured latency for later tuning.
+    Pass ttft_ms=None for non-streaming replies so they stay out of the
+    time-to-first-token estimate used for budgets.
+    """
+    entry = {**decision, "ttft_ms": ttft_ms, "total_ms": total_ms, "error": error, "ts": time.time()}
+    with _routing_lock:
+        routing_decisions.append(entry)
+        stats = routing_stats.setdefault(decision["model"], {
+            "count": 0, "errors": 0, "total_ms_total": 0.0,
+            "ttft_samples": 0, "ttft_ms_ewma": None, "budget_misses": 0,
+        })
+        if error:
+            stats["errors"] += 1
+        else:
+            stats["count"] += 1
+            stats["total_ms_total"] += total_ms
+            if ttft_ms is not None:
+                stats["ttft_samples"] += 1
+                if stats["ttft_ms_ewma"] is None:
+                    stats["ttft_ms_ewma"] = ttft_ms
+                else:
+                    stats["ttft_ms_ewma"] += LATENCY_EWMA_ALPHA * (ttft_ms - stats["ttft_ms_ewma"])
+                budget = decision.get("latency_budget_ms")
+                if budget and ttft_ms > budget:
+                    stats["budget_misses"] += 1
+    log.info("Routing outcome", extra={"fields": entry})
+
+
+def get_routing_report() -> dict:
+    with _routing_lock:
+        models = {
+            model: {
+                **stats,
+                "avg_total_ms": stats["total_ms_total"] / stats["count"] if stats["count"] else None,
+            }
+            for model, stats in routing_stats.items()
+        }
+        return {"models": models, "recent": list(routing_decisions)}
@@ -0,0 +1,57 @@
+import os
+import threading
+from collections import deque
+
+import httpx
+
+from app.services.chat_logger import get_logger
+
+OUTBOUND_SENDER = os.getenv("OUTBOUND_SENDER", "log").lower()
+PAGE_ACCESS_TOKEN = os.getenv("PAGE_ACCESS_TOKEN")
+GRAPH_API_URL = "https://graph.facebook.com/v19.0/me/messages"
+MESSENGER_MAX_CHARS = 2000
+LOG_SENDER_HISTORY = 100
+
+log = get_logger("outbound_sender")
+
+
+class LogSender:
+    """Local stub: records outbound messages instead of delivering them"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = deque(maxlen=LOG_SENDER_HISTORY)
+
+    def send(self, page_id: str, recipient_id: str, text: str):
+        with self.lock:
+            self.sent.append({"page_id": page_id, "recipient_id": recipient_id, "text": text})
+        log.info("Outbound message", extra={"fields": {"page_id": page_id, "recipient_id": recipient_id, "chars": len(text)}})
+
+
+class MessengerSender:
+    """Deliver replies through the Messenger Send API"""
+
+    def send(self, page_id: str, recipient_id: str, text: str):
+        if not PAGE_ACCESS_TOKEN:
+            raise RuntimeError("PAGE_ACCESS_TOKEN not set in .env")
+        # Messenger rejects text messages longer than 2000 characters
+        for start in range(0, len(text), MESSENGER_MAX_CHARS):
+            payload = {
+                "recipient": {"id": recipient_id},
+                "messaging_type": "RESPONSE",
+                "message": {"text": text[start:start + MESSENGER_MAX_CHARS]},
+            }
+            response = httpx.post(GRAPH_API_URL, params={"access_token": PAGE_ACCESS_TOKEN}, json=payload, timeout=30.0)
+            response.raise_for_status()
+
+
+SENDERS = {
+    "log": LogSender,
+    "messenger": MessengerSender,
+}
+
+
+def get_sender():
+    if OUTBOUND_SENDER not in SENDERS:
+        raise RuntimeError(f"Unknown OUTBOUND_SENDER '{OUTBOUND_SENDER}'")
+    return SENDERS[OUTBOUND_SENDER]()
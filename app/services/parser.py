@@ -1,6 +1,19 @@
 import re
 import json
 
+JSON_BLOCK_PATTERN = re.compile(r"<<JSON>>(.*?)<<ENDJSON>>", re.DOTALL)
+
+def strip_json_blocks(text: str) -> str:
+    """
+    Remove every <<JSON>> ... <<ENDJSON>> block, leaving only the text
+    the user actually saw.
+    """
+    if not text:
+        return text
+    cleaned_text = JSON_BLOCK_PATTERN.sub("", text)
+    cleaned_text = re.sub(r'\n\s*\n', '\n\n', cleaned_text)
+    return cleaned_text.strip()
+
 def parse_booking_confirmation(text: str) -> dict:
     """
     Extract JSON from <<JSON>> ... <<ENDJSON>> safely.
@@ -42,3 +55,57 @@ def parse_booking_confirmation(text: str) -> dict:
     data = {k: v for k, v in data.items() if str(v).strip() != ""}
 
     return data
+
+
+class JSONFilterState:
+    """
+    Incrementally strip <<JSON>> ... <<ENDJSON>> blocks from streamed text.
+    Returns only the parts that are safe to show to the user.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.in_json = False
+        self.json_start_marker = "<<JSON>>"
+        self.json_end_marker = "<<ENDJSON>>"
+        self.start_marker_len = len(self.json_start_marker)
+        self.end_marker_len = len(self.json_end_marker)
+
+    def process_chunk(self, chunk):
+        self.buffer += chunk
+        visible_parts = []
+
+        while self.buffer:
+            if not self.in_json:
+                start_pos = self.buffer.find(self.json_start_marker)
+                if start_pos != -1:
+                    if start_pos > 0:
+                        visible_parts.append(self.buffer[:start_pos])
+                    self.buffer = self.buffer[start_pos + self.start_marker_len:]
+                    self.in_json = True
+                else:
+                    if len(self.buffer) >= self.start_marker_len:
+                        visible_parts.append(self.buffer)
+                        self.buffer = ""
+                    else:
+                        if self.json_start_marker.startswith(self.buffer):
+                            break
+                        else:
+                            visible_parts.append(self.buffer)
+                            self.buffer = ""
+                    break
+            else:
+                end_pos = self.buffer.find(self.json_end_marker)
+                if end_pos != -1:
+                    self.buffer = self.buffer[end_pos + self.end_marker_len:]
+                    self.in_json = False
+                else:
+                    if len(self.buffer) >= self.end_marker_len:
+                        self.buffer = ""
+                    else:
+                        break
+        return visible_parts
+
+    def get_remaining_visible(self):
+        if self.buffer and not self.in_json:
+            return self.buffer
+        return ""
@@ -0,0 +1,217 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from app.services.parser import strip_json_blocks
+
+SEARCH_DB_PATH = Path(os.getenv("SEARCH_DB_PATH", "data/search.db"))
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Matches counted (and bm25-ranked) per query. Broader queries report a
+# capped total and return the most recent matches instead of ranking them all.
+RANK_LIMIT = int(os.getenv("SEARCH_RANK_LIMIT", "2000"))
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    page_id,
+    conv_key UNINDEXED,
+    user_id UNINDEXED,
+    role UNINDEXED,
+    created_at UNINDEXED
+);
+CREATE TABLE IF NOT EXISTS lead_rows (
+    id INTEGER PRIMARY KEY,
+    page_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (page_id, user_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS leads_fts USING fts5(
+    content,
+    page_id,
+    user_id UNINDEXED
+);
+"""
+
+
+def _connect():
+    """One connection per thread; the schema is created on first use"""
+    global _schema_ready
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        SEARCH_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(SEARCH_DB_PATH, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                conn.executescript(SCHEMA)
+                _schema_ready = True
+    return conn
+
+
+def _lead_text(lead: dict) -> str:
+    """
+    Flatten a lead's answers into searchable text. Field names are the long
+    setup questions, so they stay out of the index (they live in lead_rows.data).
+    """
+    parts = []
+    for key, value in lead.items():
+        if key in ("user_id", "page_id"):
+            continue
+        value = str(value).strip()
+        if value and value != "...":
+            parts.append(value)
+    return "\n".join(parts)
+
+
+def build_match_query(query: str, page_id: str) -> str:
+    """
+    Turn free text into a safe FTS5 MATCH expression scoped to a page.
+    Quoted substrings are kept as phrases; every other word must match.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]+)"|(\S+)', query or ""):
+        term = (phrase or word).replace('"', "").strip()
+        if term:
+            terms.append('"' + term.replace('"', '""') + '"')
+    if not terms:
+        raise ValueError("Empty search query")
+    page = '"' + str(page_id).replace('"', '""') + '"'
+    return f"page_id : {page} AND content : ({' '.join(terms)})"
+
+
+# --- Index Updates ---
+def index_message(conv_key: str, role: str, content: str):
+    if role not in ("user", "assistant"):
+        return
+    text = strip_json_blocks(content)
+    if not text:
+        return
+    page_id, _, user_id = conv_key.partition("_")
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO messages_fts (content, page_id, conv_key, user_id, role, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (text, page_id, conv_key, user_id, role, time.time()),
+        )
+
+
+def _upsert_lead(conn, lead: dict):
+    page_id, user_id = str(lead.get("page_id", "")), str(lead.get("user_id", ""))
+    if not page_id or not user_id:
+        return
+    row = conn.execute(
+        "SELECT id FROM lead_rows WHERE page_id = ? AND user_id = ?", (page_id, user_id)
+    ).fetchone()
+    data = json.dumps(lead, ensure_ascii=False)
+    if row:
+        lead_id = row["id"]
+        conn.execute("UPDATE lead_rows SET data = ? WHERE id = ?", (data, lead_id))
+        conn.execute("DELETE FROM leads_fts WHERE rowid = ?", (lead_id,))
+    else:
+        lead_id = conn.execute(
+            "INSERT INTO lead_rows (page_id, user_id, data) VALUES (?, ?, ?)", (page_id, user_id, data)
+        ).lastrowid
+    conn.execute(
+        "INSERT INTO leads_fts (rowid, content, page_id, user_id) VALUES (?, ?, ?, ?)",
+        (lead_id, _lead_text(lead), page_id, user_id),
+    )
+
+
+def index_lead(lead: dict):
+    conn = _connect()
+    with conn:
+        _upsert_lead(conn, lead)
+
+
+def rebuild_leads_index(leads: list):
+    """Replace the leads index with the current contents of leads.json"""
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM leads_fts")
+        conn.execute("DELETE FROM lead_rows")
+        for lead in leads:
+            _upsert_lead(conn, lead)
+
+
+def clear_messages_index():
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM messages_fts")
+
+
+def clear_leads_index():
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM leads_fts")
+        conn.execute("DELETE FROM lead_rows")
+
+
+# --- Queries ---
+def search(page_id: str, query: str, kind: str = "messages", limit: int = DEFAULT_PAGE_SIZE, offset: int = 0) -> dict:
+    """
+    Paginated search over messages or leads for one page. Up to RANK_LIMIT
+    matches are ranked by bm25; broader queries are ordered newest first and
+    report total as a lower bound (total_capped).
+    """
+    match = build_match_query(query, page_id)
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    offset = max(0, offset or 0)
+    table = "leads_fts" if kind == "leads" else "messages_fts"
+    conn = _connect()
+
+    total = conn.execute(
+        f"SELECT count(*) FROM (SELECT 1 FROM {table} WHERE {table} MATCH ? LIMIT ?)", (match, RANK_LIMIT + 1)
+    ).fetchone()[0]
+    total_capped = total > RANK_LIMIT
+    total = min(total, RANK_LIMIT)
+    order = "rowid DESC" if total_capped else "rank"
+
+    if kind == "leads":
+        rows = conn.execute(
+            f"""
+            SELECT f.user_id, f.page_id, snippet(leads_fts, 0, '[', ']', '…', 16) AS snippet, r.data
+            FROM leads_fts f JOIN lead_rows r ON r.id = f.rowid
+            WHERE leads_fts MATCH ?
+            ORDER BY f.{order} LIMIT ? OFFSET ?
+            """,
+            (match, limit, offset),
+        ).fetchall()
+        results = [
+            {"user_id": r["user_id"], "page_id": r["page_id"], "snippet": r["snippet"], "lead": json.loads(r["data"])}
+            for r in rows
+        ]
+    else:
+        rows = conn.execute(
+            f"""
+            SELECT conv_key, user_id, page_id, role, created_at,
+                   snippet(messages_fts, 0, '[', ']', '…', 16) AS snippet
+            FROM messages_fts
+            WHERE messages_fts MATCH ?
+            ORDER BY {order} LIMIT ? OFFSET ?
+            """,
+            (match, limit, offset),
+        ).fetchall()
+        results = [dict(r) for r in rows]
+
+    return {
+        "results": results,
+        "total": total,
+        "total_capped": total_capped,
+        "order": "recent" if total_capped else "relevance",
+        "limit": limit,
+        "offset": offset,
+    }
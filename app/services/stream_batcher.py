@@ -0,0 +1,106 @@
+import json
+import time
+import zlib
+
+# --- Batching Defaults ---
+DEFAULT_WINDOW_MS = 30
+DEFAULT_MAX_BYTES = 512
+MIN_WINDOW_MS = 0
+MAX_WINDOW_MS = 250
+MIN_MAX_BYTES = 1
+MAX_MAX_BYTES = 16384
+
+
+def sse_frame(payload) -> str:
+    """Encode a payload as a single SSE data frame"""
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def _clamp_int(value, default, low, high):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(low, min(high, value))
+
+
+class SSEBatcher:
+    """
+    Coalesce streamed content deltas into fewer SSE frames.
+    The first visible token is flushed immediately so time-to-first-token
+    is unchanged; after that, deltas are buffered until either the time
+    window elapses or the buffer reaches max_bytes.
+    """
+
+    def __init__(self, window_ms=DEFAULT_WINDOW_MS, max_bytes=DEFAULT_MAX_BYTES, flush_first=True):
+        self.window = window_ms / 1000.0
+        self.max_bytes = max_bytes
+        self.flush_first = flush_first
+        self.parts = []
+        self.size = 0
+        self.started_at = None
+        self.sent_first = False
+
+    def add(self, text: str):
+        """Buffer a delta; return an SSE frame when the batch is due, else None"""
+        if not text:
+            return None
+
+        self.parts.append(text)
+        self.size += len(text.encode("utf-8"))
+        now = time.monotonic()
+        if self.started_at is None:
+            self.started_at = now
+
+        if self.flush_first and not self.sent_first:
+            return self.flush()
+        if self.size >= self.max_bytes or now - self.started_at >= self.window:
+            return self.flush()
+        return None
+
+    def poll(self):
+        """Return the buffered batch once its time window has elapsed, else None"""
+        if self.started_at is None:
+            return None
+        if time.monotonic() - self.started_at >= self.window:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Return buffered content as one SSE frame, or None if empty"""
+        if not self.parts:
+            return None
+        content = "".join(self.parts)
+        self.parts = []
+        self.size = 0
+        self.started_at = None
+        self.sent_first = True
+        return sse_frame({"content": content})
+
+
+def batcher_from_args(args) -> SSEBatcher:
+    """Build a batcher from per-client query parameters (batch_ms, batch_bytes)"""
+    window_ms = _clamp_int(args.get("batch_ms"), DEFAULT_WINDOW_MS, MIN_WINDOW_MS, MAX_WINDOW_MS)
+    max_bytes = _clamp_int(args.get("batch_bytes"), DEFAULT_MAX_BYTES, MIN_MAX_BYTES, MAX_MAX_BYTES)
+    return SSEBatcher(window_ms=window_ms, max_bytes=max_bytes)
+
+
+def wants_gzip(args, headers) -> bool:
+    """Compression is opt-in per client and must also be accepted by the client"""
+    requested = args.get("compress", "").lower() == "gzip"
+    accepted = "gzip" in headers.get("Accept-Encoding", "").lower()
+    return requested and accepted
+
+
+def gzip_stream(frames):
+    """
+    Gzip a stream of SSE frames, sync-flushing after each frame so the
+    client can decode every batch as soon as it arrives.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for frame in frames:
+        data = compressor.compress(frame.encode("utf-8"))
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush(zlib.Z_FINISH)
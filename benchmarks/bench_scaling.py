@@ -0,0 +1,291 @@
+"""
+Scaling microbenchmarks for the persistence and parsing layers.
+
+Generates synthetic corpora of conversations and leads at increasing sizes
+and reports wall time and peak memory for each operation, so storage and
+parser changes can be compared on numbers rather than impressions.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_scaling                     # compare to baseline
+    python -m benchmarks.bench_scaling --save-baseline     # record a new baseline
+    python -m benchmarks.bench_scaling --sizes 10,100,1000 --only parse_booking_confirmation
+    python -m benchmarks.bench_scaling --sizes 300000 --only search_index.search_phrase --only search_index.search_common
+
+Everything runs inside a temporary working directory so the real
+conversations.json, chat_status.json and data/ files are never touched.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+DEFAULT_THRESHOLD = 0.25
+# Timings below this are too noisy to flag as regressions
+MIN_FLAGGED_SECONDS = 0.001
+# Absolute latency targets (seconds) checked at every size, independent of the baseline
+TARGETS = {
+    "search_index.search_phrase": 0.1,
+    "search_index.search_common": 0.1,
+}
+
+WORDS = (
+    "project management team lead deadline client stakeholder budget design "
+    "research analysis strategy mentor coach learning feedback challenge "
+    "result impact growth communication planning volunteer student internship"
+).split()
+
+
+# --- Synthetic Data ---
+def make_sentence(rng, n_words=20):
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + "."
+
+
+def make_assistant_reply(rng, fields):
+    filled = {f: (make_sentence(rng, 6) if rng.random() < 0.5 else "...") for f in fields}
+    body = ",\n".join(f'    "{k}": "{v}"' for k, v in filled.items())
+    return f"{make_sentence(rng)}\n\n**{make_sentence(rng, 10)}**\n\n<<JSON>>\n{{\n{body}\n}}\n<<ENDJSON>>"
+
+
+def make_fields(n):
+    return [f"Question {i}: what happened in story {i}?" for i in range(n)]
+
+
+def make_conversations(n, rng, fields):
+    conversations = {}
+    for i in range(n):
+        conv_key = f"page{i % 50}_user{i}"
+        messages = [{"role": "system", "content": "Synthetic system prompt."}]
+        for _ in range(3):
+            messages.append({"role": "user", "content": make_sentence(rng)})
+            messages.append({"role": "assistant", "content": make_assistant_reply(rng, fields)})
+        conversations[conv_key] = messages
+    return conversations
+
+
+def make_chat_status(n):
+    return {f"page{i % 50}_user{i}": {"closed": True, "closed_at": str(1759316156.0 + i)} for i in range(n)}
+
+
+def make_leads(n, rng, fields):
+    leads = []
+    for i in range(n):
+        lead = {f: make_sentence(rng, 6) for f in fields}
+        lead["user_id"] = f"user{i}"
+        lead["page_id"] = f"page{i % 50}"
+        leads.append(lead)
+    return leads
+
+
+def make_token_stream(n, rng, fields):
+    """A single reply of roughly n small chunks, like an upstream token stream"""
+    text = ""
+    while len(text) < n * 4:
+        text += make_assistant_reply(rng, fields) + "\n"
+    return [text[i:i + 4] for i in range(0, n * 4, 4)]
+
+
+# --- Operations ---
+# Each factory takes (size, rng) and returns a zero-argument callable to measure.
+def op_save_conversations(size, rng):
+    from app.routes import bot_routes
+    bot_routes.conversations = make_conversations(size, rng, make_fields(5))
+    return bot_routes.save_conversations_to_file
+
+
+def op_load_chat_status(size, rng):
+    from app.routes import bot_routes
+    bot_routes.save_chat_status(make_chat_status(size))
+    return bot_routes.load_chat_status
+
+
+def op_save_json(size, rng):
+    from app.services.file_store import save_json
+    leads = make_leads(size, rng, make_fields(5))
+    path = Path("data/bench_leads.json")
+    return lambda: save_json(path, leads)
+
+
+def op_load_json(size, rng):
+    from app.services.file_store import save_json, load_json
+    path = Path("data/bench_leads.json")
+    save_json(path, make_leads(size, rng, make_fields(5)))
+    return lambda: load_json(path, default=[])
+
+
+def op_parse_booking_confirmation(size, rng):
+    from app.services.parser import parse_booking_confirmation
+    fields = make_fields(5)
+    replies = [make_assistant_reply(rng, fields) for _ in range(size)]
+    return lambda: [parse_booking_confirmation(r) for r in replies]
+
+
+def op_json_filter_process_chunk(size, rng):
+    from app.services.parser import JSONFilterState
+    chunks = make_token_stream(size, rng, make_fields(5))
+
+    def run():
+        json_filter = JSONFilterState()
+        for chunk in chunks:
+            json_filter.process_chunk(chunk)
+        json_filter.get_remaining_visible()
+    return run
+
+
+def op_build_context(size, rng):
+    from app.services.context_builder import build_context
+    setup = {"page_id": "page0", "field": make_fields(size)}
+    return lambda: build_context(setup)
+
+
+def _fresh_search_index(size, rng):
+    """Point the search index at a new database holding `size` messages in one page"""
+    from app.services import search_index
+    if getattr(search_index._local, "conn", None) is not None:
+        search_index._local.conn.close()
+    search_index._local.conn = None
+    search_index._schema_ready = False
+    search_index.SEARCH_DB_PATH = Path(f"data/search_{size}.db")
+    conn = search_index._connect()
+    with conn:
+        conn.executemany(
+            "INSERT INTO messages_fts (content, page_id, conv_key, user_id, role, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            ((make_sentence(rng, 30), "page0", f"page0_user{i}", f"user{i}", "user", float(i)) for i in range(size)),
+        )
+    return search_index
+
+
+def op_search_phrase(size, rng):
+    search_index = _fresh_search_index(size, rng)
+    return lambda: search_index.search("page0", '"project management"')
+
+
+def op_search_common(size, rng):
+    search_index = _fresh_search_index(size, rng)
+    return lambda: search_index.search("page0", "team")
+
+
+OPERATIONS = {
+    "save_conversations_to_file": op_save_conversations,
+    "load_chat_status": op_load_chat_status,
+    "file_store.save_json": op_save_json,
+    "file_store.load_json": op_load_json,
+    "parse_booking_confirmation": op_parse_booking_confirmation,
+    "JSONFilterState.process_chunk": op_json_filter_process_chunk,
+    "build_context": op_build_context,
+    "search_index.search_phrase": op_search_phrase,
+    "search_index.search_common": op_search_common,
+}
+
+
+# --- Measurement ---
+def measure(fn, repeat):
+    """Best-of-N wall time, then one separate traced run for peak memory"""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def run_benchmarks(names, sizes, repeat, seed):
+    results = {}
+    for name in names:
+        for size in sizes:
+            rng = random.Random(seed)
+            fn = OPERATIONS[name](size, rng)
+            seconds, peak = measure(fn, repeat)
+            results[f"{name}@{size}"] = {"seconds": seconds, "peak_bytes": peak}
+            print(f"{name:<32} {size:>7}  {seconds * 1000:>10.2f} ms  {peak / 1024:>10.1f} KiB", flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            before, after = previous[metric], current[metric]
+            if metric == "seconds" and after < MIN_FLAGGED_SECONDS:
+                continue
+            if before and after > before * (1 + threshold):
+                regressions.append((key, metric, before, after))
+    return regressions
+
+
+def missed_targets(results):
+    missed = []
+    for key, current in results.items():
+        target = TARGETS.get(key.split("@")[0])
+        if target is not None and current["seconds"] > target:
+            missed.append((key, target, current["seconds"]))
+    return missed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES))
+    parser.add_argument("--only", action="append", choices=sorted(OPERATIONS), help="operation to run (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown ratio")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    names = args.only or list(OPERATIONS)
+
+    # ai_client refuses to import without keys; benchmarks never call the APIs
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("DEESEEK_API_KEY", "bench")
+    sys.path.insert(0, str(REPO_ROOT))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        Path("data").mkdir()
+        results = run_benchmarks(names, sizes, args.repeat, args.seed)
+
+    missed = missed_targets(results)
+    for key, target, seconds in missed:
+        print(f"TARGET MISSED {key}: {seconds * 1000:.1f} ms > {target * 1000:.0f} ms")
+
+    if args.save_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 1 if missed else 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 1 if missed else 0
+
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+    for key, metric, before, after in regressions:
+        print(f"REGRESSION {key} {metric}: {before:.6g} -> {after:.6g} ({after / before:.2f}x)")
+    if not regressions:
+        print("No regressions against baseline")
+    return 1 if regressions or missed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
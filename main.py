@@ -20,6 +20,10 @@ def create_app():
     from app.routes import bot_routes
     bot_routes.clear_chat_status_file()
     bot_routes.clear_conversations_file()
+
+    from app.services.file_store import leads
+    from app.services.search_index import rebuild_leads_index
+    rebuild_leads_index(leads)
  
 
     @app.route("/")
@@ -0,0 +1,20 @@
+import json
+import logging
+import sys
+
+from app.services.chat_logger import DroppingQueueHandler, JSONFormatter
+
+
+def test_exception_survives_queue_prepare():
+    logger = logging.getLogger("careerbot.test")
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        record = logger.makeRecord(logger.name, logging.ERROR, __file__, 0, "boom %s", (1,), sys.exc_info())
+
+    prepared = DroppingQueueHandler(None).prepare(record)
+    entry = json.loads(JSONFormatter().format(prepared))
+
+    assert entry["msg"] == "boom 1"
+    assert "ZeroDivisionError" in entry["exc"]
+    assert "Traceback" not in entry["msg"]
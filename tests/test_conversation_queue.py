@@ -0,0 +1,72 @@
+import random
+import threading
+import time
+
+import pytest
+
+from app.services.conversation_queue import ConversationQueue, QueueFull
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_messages_are_handled_in_order_per_conversation():
+    handled = {}
+    active = set()
+    overlaps = []
+    lock = threading.Lock()
+
+    def handler(conv_key, item):
+        with lock:
+            if conv_key in active:
+                overlaps.append(conv_key)
+            active.add(conv_key)
+        time.sleep(random.random() / 1000)
+        with lock:
+            active.discard(conv_key)
+            handled.setdefault(conv_key, []).append(item)
+
+    queue = ConversationQueue(handler, max_workers=4, max_pending=10000)
+    for i in range(500):
+        queue.submit(f"page_user{i % 7}", i)
+
+    assert wait_until(lambda: queue.stats()["conversations"] == 0)
+    assert sum(len(items) for items in handled.values()) == 500
+    assert all(items == sorted(items) for items in handled.values())
+    assert overlaps == []
+
+
+def test_queue_full_when_backlog_limit_reached():
+    release = threading.Event()
+    queue = ConversationQueue(lambda conv_key, item: release.wait(5), max_workers=1, max_pending=2)
+
+    queue.submit("a", 1)
+    assert wait_until(lambda: queue.stats()["pending"] == 0)  # picked up by the worker
+    queue.submit("a", 2)
+    queue.submit("b", 3)
+    with pytest.raises(QueueFull):
+        queue.submit("c", 4)
+
+    release.set()
+    assert wait_until(lambda: queue.stats() == {"pending": 0, "conversations": 0})
+
+
+def test_handler_errors_do_not_stop_the_conversation():
+    handled = []
+
+    def handler(conv_key, item):
+        if item == 1:
+            raise RuntimeError("boom")
+        handled.append(item)
+
+    queue = ConversationQueue(handler, max_workers=1)
+    for i in range(3):
+        queue.submit("a", i)
+
+    assert wait_until(lambda: handled == [0, 2])
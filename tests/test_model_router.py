@@ -0,0 +1,106 @@
+import pytest
+
+from app.services import model_router
+from app.services.model_router import is_acknowledgement, record_routing_outcome, route_model
+
+FIELDS = ["Educational background", "Work experience", "Motivation", "Story", "Strengths"]
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(model_router, "routing_stats", {})
+    monkeypatch.setattr(model_router, "PROBE_RATE", 0.0)
+
+
+def conversation(last_user):
+    return [
+        {"role": "system", "content": "prompt"},
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "Hello! What did you study?"},
+        {"role": "user", "content": last_user},
+    ]
+
+
+def record_samples(model, ttft_ms, n=model_router.MIN_LATENCY_SAMPLES):
+    for _ in range(n):
+        record_routing_outcome({"model": model, "latency_budget_ms": None}, ttft_ms, ttft_ms * 2)
+
+
+@pytest.mark.parametrize("text", ["ok", "Yes, go on!", "thanks", "Sure. Next", "That’s right"])
+def test_acknowledgements(text):
+    assert is_acknowledgement(text)
+
+
+@pytest.mark.parametrize("text", ["I studied BBA at Kathmandu University", "BBA", "yes I led a team", ""])
+def test_short_answers_are_not_acknowledgements(text):
+    assert not is_acknowledgement(text)
+
+
+def test_opening_turn_uses_standard_tier():
+    decision = route_model([{"role": "system", "content": "p"}, {"role": "user", "content": "hi"}], fields=FIELDS)
+    assert (decision["stage"], decision["model"]) == ("opening", "gpt-5")
+
+
+def test_short_field_answer_is_an_interview_turn():
+    decision = route_model(conversation("I studied BBA at Kathmandu University"), fields=FIELDS)
+    assert (decision["stage"], decision["tier"]) == ("interview", "standard")
+
+
+def test_acknowledgement_uses_fast_tier():
+    decision = route_model(conversation("ok, go on"), fields=FIELDS)
+    assert (decision["stage"], decision["model"]) == ("acknowledgement", "gpt-4.1-mini")
+
+
+def test_few_open_fields_is_synthesis():
+    lead = {f: "answered" for f in FIELDS[:3]}
+    decision = route_model(conversation("ok"), fields=FIELDS, lead=lead)
+    assert (decision["stage"], decision["model"]) == ("synthesis", "gpt-5")
+
+
+def test_reply_path_keeps_its_own_standard_model():
+    decision = route_model(conversation("I led a product launch last year"), fields=FIELDS, path="reply")
+    assert (decision["tier"], decision["model"]) == ("standard", "gpt-4.1")
+
+
+def test_budget_steps_down_a_slow_tier():
+    record_samples("gpt-5", 3000)
+    decision = route_model(conversation("I led a product launch last year"), fields=FIELDS, latency_budget_ms=1000)
+    assert decision["model"] == "gpt-4.1-mini"
+    assert decision["budget_downgraded"]
+
+
+def test_budget_ignored_until_enough_samples():
+    record_samples("gpt-5", 3000, n=model_router.MIN_LATENCY_SAMPLES - 1)
+    decision = route_model(conversation("I led a product launch last year"), fields=FIELDS, latency_budget_ms=1000)
+    assert decision["model"] == "gpt-5"
+
+
+def test_synthesis_never_drops_below_standard():
+    record_samples("gpt-5", 5000)
+    record_samples("gpt-4.1", 5000)
+    lead = {f: "answered" for f in FIELDS}
+    decision = route_model(conversation("yes"), fields=FIELDS, lead=lead, latency_budget_ms=1000, path="reply")
+    assert decision["model"] == "gpt-4.1"
+
+
+def test_estimate_recovers_after_slow_spell():
+    record_samples("gpt-5", 5000)
+    record_samples("gpt-5", 500, n=20)
+    decision = route_model(conversation("I led a product launch last year"), fields=FIELDS, latency_budget_ms=1000)
+    assert decision["model"] == "gpt-5"
+
+
+def test_probe_keeps_slow_tier(monkeypatch):
+    monkeypatch.setattr(model_router, "PROBE_RATE", 1.0)
+    record_samples("gpt-5", 3000)
+    decision = route_model(conversation("I led a product launch last year"), fields=FIELDS, latency_budget_ms=1000)
+    assert decision["model"] == "gpt-5"
+    assert decision["probe"]
+
+
+def test_non_streaming_outcomes_do_not_affect_ttft():
+    for _ in range(10):
+        record_routing_outcome({"model": "gpt-5", "latency_budget_ms": None}, None, 9000)
+    decision = route_model(conversation("I led a product launch last year"), fields=FIELDS, latency_budget_ms=1000)
+    assert decision["model"] == "gpt-5"
+    assert model_router.routing_stats["gpt-5"]["count"] == 10
@@ -0,0 +1,97 @@
+import pytest
+
+from app.services import search_index
+from app.services.search_index import build_match_query
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, "SEARCH_DB_PATH", tmp_path / "search.db")
+    monkeypatch.setattr(search_index, "_schema_ready", False)
+    monkeypatch.setattr(search_index._local, "conn", None, raising=False)
+    yield search_index
+    search_index._local.conn.close()
+    search_index._local.conn = None
+
+
+def test_match_query_quotes_every_term():
+    assert build_match_query('project OR "team lead" NEAR(', "612") == (
+        'page_id : "612" AND content : ("project" "OR" "team lead" "NEAR(")'
+    )
+
+
+def test_match_query_strips_stray_quotes():
+    assert build_match_query('pro"ject', '61"2') == 'page_id : "61""2" AND content : ("project")'
+
+
+def test_match_query_rejects_empty_query():
+    with pytest.raises(ValueError):
+        build_match_query('  "" ', "612")
+
+
+def test_search_is_scoped_to_page(index):
+    index.index_message("612_u1", "user", "I love project management")
+    index.index_message("999_u2", "user", "project management here too")
+
+    found = index.search("612", '"project management"')
+    assert found["total"] == 1
+    assert found["results"][0]["conv_key"] == "612_u1"
+
+
+def test_json_blocks_are_not_indexed(index):
+    index.index_message("612_u1", "assistant", 'Great story! <<JSON>>{"secret": "hidden"}<<ENDJSON>>')
+
+    assert index.search("612", "hidden")["total"] == 0
+    assert index.search("612", "story")["total"] == 1
+
+
+def test_operator_words_are_searched_literally(index):
+    index.index_message("612_u1", "user", "coding or design")
+
+    assert index.search("612", "or")["total"] == 1
+    assert index.search("612", "NEAR( AND")["total"] == 0
+
+
+def test_pagination(index):
+    for i in range(5):
+        index.index_message(f"612_u{i}", "user", "leadership story")
+
+    page = index.search("612", "leadership", limit=2, offset=4)
+    assert page["total"] == 5
+    assert len(page["results"]) == 1
+
+
+def test_rebuild_leads_index_replaces_stale_rows(index):
+    index.index_lead({"user_id": "old", "page_id": "612", "Work experience": "project management"})
+    index.rebuild_leads_index([
+        {"user_id": "u1", "page_id": "612", "Work experience": "project management at ACME", "Skills": "..."},
+    ])
+
+    found = index.search("612", "management", kind="leads")
+    assert [r["user_id"] for r in found["results"]] == ["u1"]
+    assert index.search("612", "Skills", kind="leads")["total"] == 0
+
+
+def test_lead_field_names_are_not_indexed(index):
+    index.index_lead({
+        "user_id": "u1",
+        "page_id": "612",
+        "What common strengths or skills appear across your stories?": "patience and listening",
+    })
+
+    assert index.search("612", "strengths", kind="leads")["total"] == 0
+    assert index.search("612", "patience", kind="leads")["total"] == 1
+
+
+def test_broad_queries_report_capped_total_newest_first(index, monkeypatch):
+    monkeypatch.setattr(index, "RANK_LIMIT", 3)
+    for i in range(5):
+        index.index_message(f"612_u{i}", "user", "teamwork story")
+
+    page = index.search("612", "teamwork", limit=2)
+    assert (page["total"], page["total_capped"], page["order"]) == (3, True, "recent")
+    assert [r["conv_key"] for r in page["results"]] == ["612_u4", "612_u3"]
+
+    monkeypatch.setattr(index, "RANK_LIMIT", 10)
+    ranked = index.search("612", "teamwork")
+    assert (ranked["total"], ranked["total_capped"], ranked["order"]) == (5, False, "relevance")
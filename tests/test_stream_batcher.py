@@ -0,0 +1,75 @@
+import json
+import zlib
+
+import pytest
+
+from app.services import stream_batcher
+from app.services.stream_batcher import SSEBatcher, batcher_from_args, gzip_stream
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(stream_batcher.time, "monotonic", fake)
+    return fake
+
+
+def content(frame):
+    assert frame.startswith("data: ") and frame.endswith("\n\n")
+    return json.loads(frame[6:])["content"]
+
+
+def test_first_token_is_flushed_immediately(clock):
+    batcher = SSEBatcher(window_ms=30, max_bytes=512)
+    assert content(batcher.add("Hi")) == "Hi"
+
+
+def test_deltas_are_coalesced_until_window_elapses(clock):
+    batcher = SSEBatcher(window_ms=30, max_bytes=512)
+    batcher.add("Hi")
+    assert batcher.add(" there") is None
+    clock.now += 0.01
+    assert batcher.add(",") is None
+    clock.now += 0.025
+    assert content(batcher.add(" friend")) == " there, friend"
+
+
+def test_poll_flushes_on_deadline_without_new_content(clock):
+    batcher = SSEBatcher(window_ms=30, max_bytes=512)
+    batcher.add("Hi")
+    batcher.add(" there")
+    clock.now += 0.01
+    assert batcher.poll() is None
+    clock.now += 0.03
+    assert content(batcher.poll()) == " there"
+    assert batcher.poll() is None
+
+
+def test_size_limit_forces_flush(clock):
+    batcher = SSEBatcher(window_ms=1000, max_bytes=5)
+    batcher.add("a")
+    assert batcher.add("bc") is None
+    assert content(batcher.add("def")) == "bcdef"
+
+
+def test_flush_returns_none_when_empty(clock):
+    assert SSEBatcher().flush() is None
+
+
+def test_batcher_from_args_clamps_client_policy():
+    batcher = batcher_from_args({"batch_ms": "100000", "batch_bytes": "nope"})
+    assert batcher.window == stream_batcher.MAX_WINDOW_MS / 1000.0
+    assert batcher.max_bytes == stream_batcher.DEFAULT_MAX_BYTES
+
+
+def test_gzip_stream_round_trips():
+    frames = ["data: 1\n\n", "data: 2\n\n"]
+    assert zlib.decompress(b"".join(gzip_stream(frames)), 31) == "".join(frames).encode()
@@ -0,0 +1,74 @@
+import json
+import os
+import time
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("openai")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("DEESEEK_API_KEY", "test")
+
+from app.routes import bot_routes  # noqa: E402
+from app.services import file_store, search_index  # noqa: E402
+from app.services.conversation_queue import ConversationQueue  # noqa: E402
+
+PAGE_ID = "612"
+USERS = 200
+
+
+@pytest.fixture
+def app_state(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(search_index, "SEARCH_DB_PATH", tmp_path / "search.db")
+    monkeypatch.setattr(search_index, "_schema_ready", False)
+    monkeypatch.setattr(bot_routes, "conversations", {})
+    monkeypatch.setitem(file_store.page_to_setup_map, PAGE_ID, {
+        "page_id": PAGE_ID, "user_id": "coach", "field": ["Educational background", "Work experience"],
+    })
+    saved_leads = list(file_store.leads)
+    file_store.leads.clear()
+    yield tmp_path
+    file_store.leads[:] = saved_leads
+
+
+def fake_reply(messages, model=None):
+    """First turn fills a lead field, second turn closes the chat"""
+    user_turns = sum(1 for m in messages if m["role"] == "user")
+    if user_turns == 1:
+        return 'Thanks!\n<<JSON>>\n{"Educational background": "BBA"}\n<<ENDJSON>>'
+    return {"function": "close_chat", "message": "All done", "block_typing": True, "close_chat": True}
+
+
+def test_parallel_webhook_workers_keep_status_and_leads(app_state, monkeypatch):
+    monkeypatch.setattr(bot_routes, "generate_chatgpt_reply", fake_reply)
+    failures = []
+    monkeypatch.setattr(bot_routes.log, "exception", lambda *a, **k: failures.append(a))
+
+    def handler(conv_key, item):
+        try:
+            bot_routes.process_webhook_message(conv_key, item)
+        except Exception as e:
+            failures.append(e)
+            raise
+
+    queue = ConversationQueue(handler, max_workers=8, max_pending=10000)
+    for turn in range(2):
+        for i in range(USERS):
+            user_id = f"user{i}"
+            queue.submit(f"{PAGE_ID}_{user_id}", {"page_id": PAGE_ID, "user_id": user_id, "text": f"message {turn}"})
+
+    deadline = time.monotonic() + 30
+    while queue.stats()["conversations"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert failures == []
+    with open(bot_routes.CHAT_STATUS_FILE, encoding="utf-8") as f:
+        chat_status = json.load(f)
+    assert len(chat_status) == USERS
+    assert all(status["closed"] for status in chat_status.values())
+
+    with open("data/leads.json", encoding="utf-8") as f:
+        saved_leads = json.load(f)
+    assert sorted(lead["user_id"] for lead in saved_leads) == sorted(f"user{i}" for i in range(USERS))
+    assert all(lead["Educational background"] == "BBA" for lead in saved_leads)